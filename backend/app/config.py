@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Optional
 import os
 from dotenv import find_dotenv, load_dotenv
 
@@ -16,16 +17,23 @@ class RAGConfig(BaseSettings):
     openai_api_key: str = Field(default=os.getenv("OPENAI_API_KEY"), env="OPENAI_API_KEY")
     embedding_model: str = "text-embedding-3-small"
     llm_model: str = "gpt-4"  # Fixed model name
+    judge_model: str = "gpt-4o-mini"  # cheap classifier for cache validation
     
     # ChromaDB settings
     chroma_persist_dir: str = "./chroma_db"
+
+    # Session store settings (Redis enables multi-worker deployments)
+    redis_url: Optional[str] = Field(default=None, env="REDIS_URL")
     
     # Retrieval settings
     confidence_threshold: float = 0.85
     top_k_results: int = 5
+    context_token_budget: int = 3000
+    skip_finalize_threshold: float = 0.85
     
     # Caching settings
     cache_ttl_hours: int = 24
+    prompt_cache_threshold: float = 0.9
     max_cache_size: int = 100
     max_embedding_cache: int = 1000
     
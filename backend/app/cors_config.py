@@ -1,11 +1,17 @@
 # cors_config.py
+import os
 from fastapi.middleware.cors import CORSMiddleware
 
 def add_cors_middleware(app):
+    # Single CORS configuration for the whole app. Starlette compiles
+    # allow_origin_regex once at middleware init, so each preflight is a
+    # single regex match; the env override lets deployments add their
+    # frontend origin without a code change.
+    origin_regex = os.getenv("CORS_ORIGIN_REGEX", r"^http://localhost:3000$")
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["http://localhost:3000"],
+        allow_origin_regex=origin_regex,
         allow_credentials=True,
-        allow_methods=["*"] ,
+        allow_methods=["*"],
         allow_headers=["*"]
     )
@@ -1,24 +1,41 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Any, Optional, List, Dict, Literal, Union
 
+# Frozen models skip __setattr__ machinery, are hashable, and make clear
+# these DTOs are built once and never mutated; extra="ignore" keeps
+# validation from choking on additive client fields.
+_DTO_CONFIG = ConfigDict(frozen=True, extra="ignore")
+
 # --- Start Graph Run ---
 class StartRequest(BaseModel):
+    model_config = _DTO_CONFIG
     human_request: str
 
 # --- Resume Paused Graph Run ---
 class ResumeRequest(BaseModel):
+    model_config = _DTO_CONFIG
     thread_id: str
     review_action: Literal["approved", "feedback"]
     human_comment: Optional[str] = None
 
 # --- API Response ---
 class GraphResponse(BaseModel):
+    model_config = _DTO_CONFIG
     thread_id: str
     run_status: Literal["finished", "user_feedback", "pending"]
     assistant_response: Optional[str] = None
 
+# --- RAG Test Request ---
+class RagTestRequest(BaseModel):
+    model_config = _DTO_CONFIG
+    # Constraints make empty queries fail validation with a 422 instead
+    # of reaching retrieval, and keep top_k within a sane range
+    query: str = Field(min_length=1)
+    top_k: int = Field(default=3, ge=1, le=20)
+
 # --- Document Upload Response ---
 class DocumentUploadResponse(BaseModel):
+    model_config = _DTO_CONFIG
     status: Literal["success", "error"]
     filename: str
     chunks_created: Optional[int] = None
@@ -26,6 +43,7 @@ class DocumentUploadResponse(BaseModel):
 
 # --- FIXED: Document Status Response ---
 class DocumentStatusResponse(BaseModel):
+    model_config = _DTO_CONFIG
     total_chunks: int
     total_validated: int
-    cache_stats: Dict[str, Any]
\ No newline at end of file
+    cache_stats: Dict[str, Any]
@@ -1,4 +1,5 @@
 import hashlib
+import logging
 import re
 from typing import List, Dict, Optional
 from dataclasses import dataclass, asdict
@@ -8,6 +9,9 @@ import PyPDF2
 import tiktoken
 from app.config import config
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 @dataclass
 class DocumentChunk:
     """Structured document chunk with metadata"""
@@ -68,7 +72,7 @@ class DocumentProcessor:
             return chunks[:self.max_chunks]
             
         except Exception as e:
-            print(f"Error processing PDF {filename}: {e}")
+            logger.error(f"Error processing PDF {filename}: {e}")
             return []
     
     def process_text(self, content: str, filename: str) -> List[DocumentChunk]:
@@ -1,5 +1,7 @@
 import hashlib
 import logging
+import time
+from threading import Lock
 from typing import List, Dict, Optional
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
@@ -11,6 +13,22 @@ from app.config import config
 from app.rag.vector_store import get_vector_store
 from app.rag.rag_pipeline import get_rag_pipeline
 
+try:
+    import orjson
+
+    def _loads(raw):
+        return orjson.loads(raw)
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    # Fallback to stdlib json if orjson isn't installed
+    def _loads(raw):
+        return json.loads(raw)
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -46,7 +64,33 @@ class DualRetrievalSystem:
         # Initialize caches
         self.query_cache = {}  # {query_hash: (result, timestamp)}
         self.embedding_cache = {}  # {text_hash: embedding}
-        
+
+        # Semantic query cache: differently-phrased queries with nearly
+        # identical embeddings reuse earlier retrievals. Rows of the
+        # matrix are L2-normalized query embeddings, so one matrix-vector
+        # product gives the cosine similarity against every cached entry.
+        # Memoized stats for an empty knowledge base: polls on a cold
+        # deployment shouldn't hit Chroma metadata just to learn it's
+        # still empty. (deadline, stats) or None.
+        self._empty_stats = None
+
+        # Hit/miss counters so stats report measured rates, not guesses
+        self._query_cache_hits = 0
+        self._query_cache_misses = 0
+        self._embedding_cache_hits = 0
+        self._embedding_cache_misses = 0
+
+        self.semantic_cache_size = 256
+        self.semantic_threshold = 0.95
+        self._semantic_matrix = None  # (N, dim) normalized embeddings
+        self._semantic_entries = []  # parallel list of (results, top_k, timestamp)
+        self._semantic_lookups = 0
+        self._semantic_hits = 0
+        # Guards the paired matrix + entries structures: retrieve() runs
+        # on worker threads and add_validated_answer evicts from the
+        # background writer pool, so lookups and mutations can interleave
+        self._semantic_lock = Lock()
+
         logger.info("DualRetrievalSystem initialized")
     
     def retrieve(self, 
@@ -76,7 +120,15 @@ class DualRetrievalSystem:
         
         # Step 2: Generate query embedding
         query_embedding = self._get_embedding(query)
-        
+
+        # Step 2b: Check semantic cache - a near-identical embedding means
+        # retrieval would return essentially the same results
+        if not force_rag:
+            semantic_results = self._check_semantic_cache(query_embedding, top_k)
+            if semantic_results is not None:
+                logger.debug("Semantic cache hit - returning cached results")
+                return semantic_results[:top_k]
+
         # Step 3: Search validated answers (unless forced RAG)
         validated_results = []
         if not force_rag:
@@ -94,9 +146,10 @@ class DualRetrievalSystem:
         # Step 5: Merge and re-rank
         merged_results = self._merge_and_rerank(validated_results, rag_results, query_embedding, top_k)
         
-        # Step 6: Update cache with best result
+        # Step 6: Update caches with best result / full result set
         if merged_results:
             self._update_cache(query, merged_results[0])
+            self._update_semantic_cache(query_embedding, merged_results, top_k)
             logger.debug(f"Cached best result with confidence: {merged_results[0].confidence:.3f}")
         
         logger.info(f"Retrieved {len(merged_results)} results for query")
@@ -105,25 +158,94 @@ class DualRetrievalSystem:
     def _check_cache(self, query: str) -> Optional[RetrievalResult]:
         """Check if query result is in cache and still valid"""
         query_hash = self._hash_text(query.lower().strip())
-        
+
         if query_hash not in self.query_cache:
+            self._query_cache_misses += 1
             return None
-        
+
         result, timestamp = self.query_cache[query_hash]
-        
+
         # Check if cache entry is still valid
         age_hours = (datetime.now() - timestamp).total_seconds() / 3600
         if age_hours < config.cache_ttl_hours:
             # Update access metadata
             result.metadata['cache_hit'] = True
             result.metadata['cache_age_hours'] = round(age_hours, 2)
+            self._query_cache_hits += 1
             return result
-        
+
         # Remove stale cache entry
         del self.query_cache[query_hash]
         logger.debug(f"Removed stale cache entry (age: {age_hours:.1f}h)")
+        self._query_cache_misses += 1
         return None
-    
+
+    def _check_semantic_cache(self, query_embedding: List[float], top_k: int) -> Optional[List['RetrievalResult']]:
+        """Return cached results for a semantically near-identical query.
+
+        One BLAS matrix-vector product scores the query against every
+        cached embedding; a hit costs <1ms versus a full vector search.
+        Entries remember the top_k they were fetched with - asking for
+        more than the cached call retrieved is a miss, not a silently
+        truncated hit.
+        """
+        self._semantic_lookups += 1
+
+        query_vec = np.asarray(query_embedding)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0:  # zero-vector fallback from a failed embedding
+            return None
+
+        with self._semantic_lock:
+            if self._semantic_matrix is None or not self._semantic_entries:
+                return None
+
+            similarities = self._semantic_matrix @ (query_vec / norm)
+            best_idx = int(np.argmax(similarities))
+
+            if similarities[best_idx] < self.semantic_threshold:
+                return None
+
+            results, cached_top_k, timestamp = self._semantic_entries[best_idx]
+            age_hours = (datetime.now() - timestamp).total_seconds() / 3600
+            if age_hours >= config.cache_ttl_hours:
+                self._evict_semantic_entry(best_idx)
+                return None
+
+            if top_k > cached_top_k:
+                return None
+
+        self._semantic_hits += 1
+        return results
+
+    def _update_semantic_cache(self, query_embedding: List[float], results: List['RetrievalResult'], top_k: int):
+        """Insert a (normalized embedding, results, top_k) entry, evicting FIFO"""
+        query_vec = np.asarray(query_embedding)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0:
+            return
+
+        with self._semantic_lock:
+            if len(self._semantic_entries) >= self.semantic_cache_size:
+                self._evict_semantic_entry(0)
+
+            row = (query_vec / norm)[None, :]
+            if self._semantic_matrix is None:
+                self._semantic_matrix = row
+            else:
+                self._semantic_matrix = np.vstack([self._semantic_matrix, row])
+            self._semantic_entries.append((results, top_k, datetime.now()))
+
+    def _evict_semantic_entry(self, index: int):
+        """Drop one semantic cache entry, keeping matrix and list aligned.
+
+        Caller must hold _semantic_lock.
+        """
+        self._semantic_matrix = np.delete(self._semantic_matrix, index, axis=0)
+        del self._semantic_entries[index]
+        if not self._semantic_entries:
+            self._semantic_matrix = None
+
     def _search_validated(self, 
                         query_embedding: List[float],
                         original_query: str,
@@ -154,14 +276,14 @@ class DualRetrievalSystem:
                 # If source_file is Unknown, try to extract from validated_from_files
                 if source_file == 'Unknown':
                     try:
-                        validated_from_files = json.loads(metadata.get('validated_from_files', '[]'))
+                        validated_from_files = _loads(metadata.get('validated_from_files', '[]'))
                         if validated_from_files:
                             source_file = validated_from_files[0]  # Use first source file
                         else:
                             # Create a descriptive name based on query
                             query_preview = metadata.get('original_query', '')[:30]
                             source_file = f"Validated: {query_preview}..." if query_preview else "Validated Answer"
-                    except (json.JSONDecodeError, TypeError):
+                    except (ValueError, TypeError):
                         source_file = "Validated Answer"
                 
                 # FIXED: Reconstruct validation_info from flat metadata
@@ -176,8 +298,8 @@ class DualRetrievalSystem:
                 source_chunks = []
                 try:
                     source_chunks_json = metadata.get('source_chunks_json', '[]')
-                    source_chunks = json.loads(source_chunks_json) if source_chunks_json else []
-                except (json.JSONDecodeError, TypeError):
+                    source_chunks = _loads(source_chunks_json) if source_chunks_json else []
+                except (ValueError, TypeError):
                     source_chunks = []
                 
                 # FIXED: Enhanced metadata for better frontend display
@@ -288,37 +410,47 @@ class DualRetrievalSystem:
         logger.debug(f"Merged and ranked {len(final_results)} results")
         return final_results
     
-    def _apply_diversity_filter(self, 
+    def _apply_diversity_filter(self,
                                results: List[RetrievalResult],
                                top_k: int,
-                               similarity_threshold: float = 0.85) -> List[RetrievalResult]:
-        """Ensure diversity in results by filtering similar content"""
-        
-        if not results:
-            return []
-        
-        diverse_results = [results[0]]  # Always include top result
-        
-        for candidate in results[1:]:
-            if len(diverse_results) >= top_k:
-                break
-            
-            # Check similarity with already selected results
-            is_diverse = True
-            candidate_embedding = self._get_embedding(candidate.content[:200])
-            
-            for selected in diverse_results:
-                selected_embedding = self._get_embedding(selected.content[:200])
-                similarity = self._cosine_similarity(candidate_embedding, selected_embedding)
-                
-                if similarity > similarity_threshold:
-                    is_diverse = False
-                    break
-            
-            if is_diverse:
-                diverse_results.append(candidate)
-        
-        logger.debug(f"Applied diversity filter: {len(results)} -> {len(diverse_results)}")
+                               lambda_: float = 0.7) -> List[RetrievalResult]:
+        """Select top_k results by Maximal Marginal Relevance.
+
+        Greedy MMR: each step takes the candidate maximizing
+        lambda * confidence - (1 - lambda) * max-similarity-to-selected,
+        so near-duplicate chunks are penalized instead of wasting LLM
+        context tokens on repeated text. Candidate embeddings come from
+        one batched call and the pairwise cosine similarities from a
+        single normalized matrix product, replacing the old per-pair
+        embed-and-compare loop.
+        """
+
+        if len(results) <= 1:
+            return results[:top_k]
+
+        embeddings = np.asarray(self._get_embeddings_batch(
+            [result.content[:200] for result in results]
+        ))
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0  # zero-vector fallback rows
+        embeddings = embeddings / norms[:, None]
+        similarity = embeddings @ embeddings.T
+
+        selected = [0]  # always include the top-confidence result
+        candidates = list(range(1, len(results)))
+
+        while candidates and len(selected) < top_k:
+            mmr_scores = [
+                lambda_ * results[i].confidence
+                - (1 - lambda_) * max(similarity[i][j] for j in selected)
+                for i in candidates
+            ]
+            best = candidates[int(np.argmax(mmr_scores))]
+            selected.append(best)
+            candidates.remove(best)
+
+        diverse_results = [results[i] for i in selected]
+        logger.debug(f"Applied MMR diversity filter: {len(results)} -> {len(diverse_results)}")
         return diverse_results
     
     def add_validated_answer(self,
@@ -330,10 +462,10 @@ class DualRetrievalSystem:
         """FIXED: Add a human-validated answer with proper source file preservation"""
         
         try:
-            # Generate combined embedding (weighted average)
-            query_embedding = self._get_embedding(query)
-            answer_embedding = self._get_embedding(answer)
-            
+            # Generate combined embedding (weighted average); one batched
+            # API round trip instead of two sequential embed calls
+            query_embedding, answer_embedding = self._get_embeddings_batch([query, answer])
+
             # 30% query, 70% answer for better answer matching
             combined_embedding = [
                 0.3 * q + 0.7 * a 
@@ -383,13 +515,13 @@ class DualRetrievalSystem:
                 # FIXED: Store source file information properly
                 "source_file": primary_source_file,
                 "file": primary_source_file,  # Frontend expects 'file' key
-                "validated_from_files": json.dumps(source_file_info),  # Store all source files
+                "validated_from_files": _dumps(source_file_info),  # Store all source files
                 "section": "Validated Response",
                 # Validator info
                 "approved_by": "thread_user",
                 "approved_at": datetime.now().isoformat(),
                 "feedback_received": feedback or "",
-                "source_chunks_json": json.dumps(source_chunks),
+                "source_chunks_json": _dumps(source_chunks),
                 "confidence_score": 1.0,
                 "validation_count": 1,
                 "last_accessed": datetime.now().isoformat(),
@@ -412,21 +544,43 @@ class DualRetrievalSystem:
             query_hash = self._hash_text(query.lower().strip())
             if query_hash in self.query_cache:
                 del self.query_cache[query_hash]
+
+            # Invalidate semantic entries near this query so the new
+            # validated answer is picked up on the next retrieval
+            with self._semantic_lock:
+                if self._semantic_matrix is not None:
+                    query_vec = np.asarray(query_embedding)
+                    norm = np.linalg.norm(query_vec)
+                    if norm > 0:
+                        similarities = self._semantic_matrix @ (query_vec / norm)
+                        for idx in np.flatnonzero(similarities >= self.semantic_threshold)[::-1]:
+                            self._evict_semantic_entry(int(idx))
             
             logger.info(f"Added validated answer for query: {query[:50]}... (source: {primary_source_file})")
             
-        except Exception as e:
-            logger.error(f"Error adding validated answer: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+        except Exception:
+            # logger.exception only formats the traceback when a handler
+            # actually emits the record
+            logger.exception("Error adding validated answer")
           
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query through the shared embedding cache.
+
+        Public wrapper so other layers (e.g. the semantic prompt cache)
+        reuse embeddings already computed during retrieval instead of
+        paying for a second API call.
+        """
+        return self._get_embedding(text)
+
     def _get_embedding(self, text: str) -> List[float]:
         """Get embedding with caching"""
         text_hash = self._hash_text(text)
-        
+
         if text_hash in self.embedding_cache:
+            self._embedding_cache_hits += 1
             return self.embedding_cache[text_hash]
-        
+
+        self._embedding_cache_misses += 1
         try:
             embedding = self.embedding_model.embed_query(text)
             self.embedding_cache[text_hash] = embedding
@@ -446,6 +600,42 @@ class DualRetrievalSystem:
             # Return zero vector as fallback
             return [0.0] * 1536  # text-embedding-3-small dimension
     
+    def _get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one API round trip, honoring the cache.
+
+        Texts already in the embedding cache are served locally; the
+        remainder go out in a single embed_documents call instead of one
+        embed_query round trip each.
+        """
+        hashes = [self._hash_text(t) for t in texts]
+        missing_idx = []
+        for i, h in enumerate(hashes):
+            if h in self.embedding_cache:
+                self._embedding_cache_hits += 1
+            else:
+                self._embedding_cache_misses += 1
+                missing_idx.append(i)
+
+        if missing_idx:
+            try:
+                embedded = self.embedding_model.embed_documents([texts[i] for i in missing_idx])
+                for i, embedding in zip(missing_idx, embedded):
+                    self.embedding_cache[hashes[i]] = embedding
+
+                # Limit cache size (same FIFO trim as _get_embedding)
+                if len(self.embedding_cache) > config.max_embedding_cache:
+                    oldest_keys = list(self.embedding_cache.keys())[:100]
+                    for key in oldest_keys:
+                        del self.embedding_cache[key]
+                    logger.debug("Cleaned embedding cache")
+
+            except Exception as e:
+                logger.error(f"Error generating batch embeddings: {e}")
+
+        # Zero-vector fallback for anything that failed to embed
+        fallback = [0.0] * 1536  # text-embedding-3-small dimension
+        return [self.embedding_cache.get(h, fallback) for h in hashes]
+
     def _update_cache(self, query: str, result: RetrievalResult):
         """Update query cache with result"""
         query_hash = self._hash_text(query.lower().strip())
@@ -485,16 +675,65 @@ class DualRetrievalSystem:
             logger.error(f"Error calculating cosine similarity: {e}")
             return 0.0
     
+    def is_ready(self) -> bool:
+        """Cheap readiness check for health probes.
+
+        Touches only the collection handles - no embedding API call and
+        no vector search, so probes hitting /health every few seconds
+        cost nothing.
+        """
+        try:
+            return (self.vector_store.document_chunks is not None
+                    and self.vector_store.validated_answers is not None)
+        except Exception as e:
+            logger.warning(f"Readiness check failed: {e}")
+            return False
+
+    def invalidate_stats_cache(self):
+        """Drop the memoized empty-KB stats (call after adding documents)"""
+        self._empty_stats = None
+
     def get_stats(self) -> Dict:
         """Get retrieval system statistics"""
+        if self._empty_stats is not None and time.monotonic() < self._empty_stats[0]:
+            return self._empty_stats[1]
+
         vector_stats = self.vector_store.get_collection_stats()
         
-        return {
+        query_lookups = self._query_cache_hits + self._query_cache_misses
+        embedding_lookups = self._embedding_cache_hits + self._embedding_cache_misses
+
+        stats = {
             **vector_stats,
             "query_cache_size": len(self.query_cache),
-            "embedding_cache_size": len(self.embedding_cache)
+            "embedding_cache_size": len(self.embedding_cache),
+            "query_cache_hit_rate": (
+                self._query_cache_hits / query_lookups if query_lookups else 0.0
+            ),
+            "embedding_cache_hit_rate": (
+                self._embedding_cache_hits / embedding_lookups if embedding_lookups else 0.0
+            ),
+            "semantic_cache_size": len(self._semantic_entries),
+            "semantic_cache_hit_rate": (
+                self._semantic_hits / self._semantic_lookups
+                if self._semantic_lookups else 0.0
+            )
         }
 
+        # Empty KB: pin the snapshot for 30s so repeated polls skip Chroma
+        if stats.get('document_chunks_count', 0) == 0:
+            self._empty_stats = (time.monotonic() + 30, stats)
+
+        return stats
+
+    def clear_caches(self):
+        """Clear all retrieval caches"""
+        self.query_cache.clear()
+        self.embedding_cache.clear()
+        with self._semantic_lock:
+            self._semantic_matrix = None
+            self._semantic_entries.clear()
+
 # Singleton instance
 _dual_retriever = None
 
@@ -0,0 +1,117 @@
+import logging
+import time
+from threading import Lock
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.config import config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class SemanticPromptCache:
+    """Semantic cache for full LLM draft responses.
+
+    Sits in front of the draft LLM call: a query whose embedding is
+    nearly identical (cosine >= config.prompt_cache_threshold) to a
+    recently answered one reuses that response, replacing a full LLM
+    round trip with one matrix-vector product. Rows of the matrix are
+    L2-normalized embeddings, mirroring the semantic query cache in the
+    dual retriever.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._matrix = None  # (N, dim) normalized embeddings
+        self._entries: List[Tuple[str, str, list, float]] = []  # (query, response, sources, timestamp)
+        self._lookups = 0
+        self._hits = 0
+        # Guards the paired matrix + entries structures: assistant_draft
+        # runs on a worker thread per in-flight stream, so concurrent
+        # drafts can interleave add's evict-then-append with a query
+        self._lock = Lock()
+
+    def query(self, embedding: List[float]) -> Optional[Tuple[str, str, list]]:
+        """Return (cached_query, response, sources) for a near-identical query, or None
+
+        The cached query text is returned alongside the response so the
+        caller can run a second-stage equivalence check before trusting
+        the hit - cosine similarity alone conflates e.g. "set up X" with
+        "uninstall X".
+        """
+        self._lookups += 1
+
+        vec = np.asarray(embedding)
+        norm = np.linalg.norm(vec)
+        if norm == 0:  # zero-vector fallback from a failed embedding
+            return None
+
+        with self._lock:
+            if self._matrix is None or not self._entries:
+                return None
+
+            similarities = self._matrix @ (vec / norm)
+            best_idx = int(np.argmax(similarities))
+
+            if similarities[best_idx] < config.prompt_cache_threshold:
+                return None
+
+            query, response, sources, timestamp = self._entries[best_idx]
+            if time.time() - timestamp >= config.cache_ttl_hours * 3600:
+                self._evict(best_idx)
+                return None
+
+        self._hits += 1
+        return query, response, sources
+
+    def add(self, embedding: List[float], query: str, response: str, sources: list):
+        """Insert a (normalized embedding, response) pair, evicting FIFO"""
+        vec = np.asarray(embedding)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return
+
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._evict(0)
+
+            row = (vec / norm)[None, :]
+            if self._matrix is None:
+                self._matrix = row
+            else:
+                self._matrix = np.vstack([self._matrix, row])
+            self._entries.append((query, response, sources, time.time()))
+
+    def _evict(self, index: int):
+        """Drop one entry, keeping matrix and list aligned.
+
+        Caller must hold _lock.
+        """
+        self._matrix = np.delete(self._matrix, index, axis=0)
+        del self._entries[index]
+        if not self._entries:
+            self._matrix = None
+
+    def get_stats(self) -> dict:
+        return {
+            "prompt_cache_size": len(self._entries),
+            "prompt_cache_hit_rate": (
+                self._hits / self._lookups if self._lookups else 0.0
+            )
+        }
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._entries.clear()
+
+# Singleton instance
+_prompt_cache = None
+
+def get_prompt_cache() -> SemanticPromptCache:
+    """Get or create singleton prompt cache instance"""
+    global _prompt_cache
+    if _prompt_cache is None:
+        _prompt_cache = SemanticPromptCache()
+    return _prompt_cache
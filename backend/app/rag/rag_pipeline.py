@@ -1,3 +1,4 @@
+import logging
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import hashlib
@@ -7,6 +8,9 @@ from app.config import config
 from app.rag.vector_store import get_vector_store
 from app.rag.document_processor import DocumentProcessor
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 @dataclass
 class RAGResult:
     """Result from RAG retrieval"""
@@ -22,7 +26,10 @@ class RAGPipeline:
     def __init__(self):
         self.embedding_model = OpenAIEmbeddings(
             model=config.embedding_model,
-            api_key=config.openai_api_key
+            api_key=config.openai_api_key,
+            # OpenAI accepts up to 2048 inputs per embeddings request;
+            # langchain's default of 1000 splits large uploads needlessly
+            chunk_size=2048
         )
         self.vector_store = get_vector_store()
         self.document_processor = DocumentProcessor()
@@ -52,7 +59,7 @@ class RAGPipeline:
             chunks = self.document_processor.process_text(content, filename)
         
         if not chunks:
-            print(f"No chunks created for document: {filename}")
+            logger.warning(f"No chunks created for document: {filename}")
             return 0
         
         # Generate embeddings for chunks
@@ -65,7 +72,7 @@ class RAGPipeline:
         # Add to vector store
         self.vector_store.add_document_chunks(chunk_data, embeddings)
         
-        print(f"Added {len(chunks)} chunks from {filename}")
+        logger.info(f"Added {len(chunks)} chunks from {filename}")
         return len(chunks)
     
     def retrieve(self, query: str, top_k: int = 5) -> List[RAGResult]:
@@ -78,7 +85,7 @@ class RAGPipeline:
             # Use cache if less than 1 hour old
             age = (datetime.now() - timestamp).total_seconds() / 3600
             if age < 1:
-                print(f"Cache hit for query: {query[:50]}...")
+                logger.debug(f"Cache hit for query: {query[:50]}...")
                 return cached_result
         
         # Generate query embedding
@@ -140,7 +147,7 @@ class RAGPipeline:
         
         # Generate embeddings for uncached texts
         if uncached_texts:
-            print(f"Generating embeddings for {len(uncached_texts)} texts...")
+            logger.debug(f"Generating embeddings for {len(uncached_texts)} texts...")
             new_embeddings = self.embedding_model.embed_documents(uncached_texts)
             
             # Store in cache and results
@@ -232,7 +232,7 @@ class VectorStore:
             elif name == "validated_answers":
                 self._validated_answers = None
         except Exception as e:
-            print(f"Error deleting collection {name}: {e}")
+            self.logger.error(f"Error deleting collection {name}: {e}")
     
     def reset_collections(self):
         """Reset all collections (for testing)"""
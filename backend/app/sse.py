@@ -0,0 +1,20 @@
+import asyncio
+
+from sse_starlette.sse import EventSourceResponse
+
+
+class EventSourceResponseNoPing(EventSourceResponse):
+    """EventSourceResponse without the periodic ping task.
+
+    sse-starlette's built-in pinger shares an anyio.Lock with the event
+    writer, costing a lock acquire/release per emitted chunk. At high
+    token flush rates that overhead shows up in tail latency, so this
+    variant parks the ping task forever; keep-alives, where needed, are
+    emitted from the event generator itself.
+    """
+
+    async def _ping(self, send) -> None:
+        # Park until the response tears the task down with the stream;
+        # never touches the writer lock
+        while True:
+            await asyncio.sleep(3600)